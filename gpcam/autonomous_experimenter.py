@@ -1,12 +1,54 @@
 # /usr/bin/env python
 import inspect
+import math
+import pickle
 import time
-import dask
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import numpy as np
 from loguru import logger
 from gpcam.data import fvgpData, gpData
 from gpcam.gp_optimizer import GPOptimizer, fvGPOptimizer
 
+_INIT_MESSAGE = inspect.cleandoc("""#
+    ##################################################################################
+    Autonomous Experimenter initialization successfully concluded
+    now train(...) or train_async(...), and then go(...)
+    ##################################################################################""")
+_FVGP_INIT_MESSAGE = inspect.cleandoc("""#
+    ##################################################################################
+    Autonomous Experimenter fvGP initialization successfully concluded
+    now train(...) or train_async(...), and then go(...)
+    ##################################################################################""")
+_CONCLUDED_MESSAGE = inspect.cleandoc("""#
+    ====================================================
+    The autonomous experiment was concluded successfully
+    ====================================================""")
+
+
+def _measurement_info(hyperparameters, post_std, number_of_points):
+    # the info attached to each newly suggested data point
+    return [{"hyperparameters": hyperparameters, "posterior std": post_std[j]} for j in range(number_of_points)]
+
+
+def _retrain_method(new_measurements, retrain_async_at, retrain_globally_at, retrain_locally_at):
+    # returns the training that is due after new_measurements (a range of measurement numbers), or None;
+    # the retrain_*_at arguments are sets
+    if not retrain_async_at.isdisjoint(new_measurements): return "async"
+    if not retrain_globally_at.isdisjoint(new_measurements): return "global"
+    if not retrain_locally_at.isdisjoint(new_measurements): return "local"
+    return None
+
+
+def _append_rows(buffer, n, rows):
+    # writes rows behind the first n rows of buffer; the capacity doubles whenever it is exceeded
+    if buffer is None or n + len(rows) > len(buffer):
+        grown = np.empty((max(64, 2 * (n + len(rows))),) + rows.shape[1:], dtype=rows.dtype)
+        if n > 0: grown[:n] = buffer[:n]
+        buffer = grown
+    buffer[n:n + len(rows)] = rows
+    return buffer
+
 
 class AutonomousExperimenterGP:
     """
@@ -38,7 +80,9 @@ class AutonomousExperimenterGP:
          A function that takes data points (a list of dicts), and returns the same
          with the measurement data filled in. The function is
          expected to communicate with the instrument and perform measurements,
-         populating fields of the data input.
+         populating fields of the data input. The returned list is appended to the
+         existing dataset (or replaces it if `communicate_full_dataset` is True);
+         filling in the given dictionaries in place and returning the input list is sufficient.
     init_dataset_size : int, optional
         If `x` and `y` are not provided and `dataset` is not provided,
         `init_dataset_size` must be provided. An initial
@@ -125,12 +169,18 @@ class AutonomousExperimenterGP:
         Initial data point observation variances.
     dataset : string, optional
         A filename of a gpcam-generated file that is used to initialize a new instance.
+        This is either the `np.save` checkpoint or the ".pkl" checkpoint log written by go().
     communicate_full_dataset : bool, optional
         If True, the full dataset will be communicated to the `instrument_function`
         on each iteration. If False, only the
         newly suggested data points will be communicated. The default is False.
     compute_device : str, optional
         One of "cpu" or "gpu", determines how linear system solves are run. The default is "cpu".
+        For "gpu", pytorch has to be installed manually. It is then used for the linear solves in the
+        gradient of the log-likelihood and for the solves and log-determinants of the information-theoretic
+        acquisition functions; the stored inverse (store_inv) is computed by pytorch on the cpu.
+        The Cholesky factorization of the prior covariance and the posterior mean and variance solves
+        run on the cpu either way.
     store_inv : bool, optional
         If True, the algorithm calculates and stores the inverse of the covariance
         matrix after each training or update of the dataset or hyperparameters,
@@ -147,8 +197,19 @@ class AutonomousExperimenterGP:
         A Dask Distributed Client instance for distributed `acquisition_function`
         computation. If None is provided, a new
         `dask.distributed.Client` instance is constructed.
+    share_dask_client : bool, optional
+        If True, the training and the `acquisition_function` optimization use the same
+        `dask.distributed.Client` instance, which is the one provided (if only one is provided) or
+        the one constructed first. Note that asynchronous training occupies the workers of its client.
+        The default is False.
     info : bool, optional
         Specifies if info should be displayed. Default = False.
+    iterative_start_size : int, optional
+        Number of data points from which on the Cholesky factor of the GP prior covariance is
+        extended by the new measurements instead of being recomputed, if the noise variances
+        of the existing data are given and therefore unchanged. The default is 500.
+    resize_step : int, optional
+        Number of rows by which the buffer of the extended Cholesky factor grows. The default is 200.
 
 
     Attributes
@@ -191,12 +252,15 @@ class AutonomousExperimenterGP:
                  store_inv=False,
                  training_dask_client=None,
                  acq_func_opt_dask_client=None,
+                 share_dask_client=False,
                  gp2Scale=False,
                  gp2Scale_dask_client=None,
                  gp2Scale_batch_size=10000,
                  ram_economy=True,
                  info=False,
-                 args=None
+                 args=None,
+                 iterative_start_size=500,
+                 resize_step=200
                  ):
         if info:
             logger.enable('gpcam')
@@ -218,6 +282,7 @@ class AutonomousExperimenterGP:
         self.async_train_in_progress = False
         self.training_dask_client = training_dask_client
         self.acq_func_opt_dask_client = acq_func_opt_dask_client
+        self.share_dask_client = share_dask_client
         self.args = args
         ################################
         # getting the data ready#########
@@ -230,7 +295,8 @@ class AutonomousExperimenterGP:
             if instrument_function is None: raise Exception("You need to provide an instrument function.")
             self.data.dataset = self.instrument_function(self.data.dataset)
         elif dataset is not None:
-            self.data.inject_dataset(list(np.load(dataset, allow_pickle=True)))
+            if str(dataset).endswith(".pkl"): self.data.inject_checkpoint_log(dataset)
+            else: self.data.inject_dataset(list(np.load(dataset, allow_pickle=True)))
             hyperparameters = self.data.dataset[-1]["hyperparameters"]
         elif x_data is not None and y_data is not None:
             self.data.dataset = self.data.inject_arrays(x_data, y=y_data, v=noise_variances)
@@ -241,7 +307,7 @@ class AutonomousExperimenterGP:
             raise Exception("No viable option for data given!")
         self.data.check_incoming_data()
         if self.data.nan_in_dataset(): self.data.clean_data_NaN()
-        self.x_data, self.y_data, self.noise_variances, self.times, self.cost = self.data.extract_data()
+        self._update_data()
         self.init_dataset_size = len(self.x_data)
         ######################
         ######################
@@ -249,7 +315,7 @@ class AutonomousExperimenterGP:
         self.gp_optimizer = GPOptimizer(self.x_data, self.y_data,
                                         init_hyperparameters=hyperparameters,
                                         hyperparameter_bounds=hyperparameter_bounds,
-                                        noise_variances=self.noise_variances,
+                                        noise_variances=self.variances,
                                         compute_device=compute_device,
                                         gp_kernel_function=kernel_function,
                                         gp_kernel_function_grad=None,
@@ -266,14 +332,12 @@ class AutonomousExperimenterGP:
                                         info=info,
                                         cost_function=cost_function,
                                         cost_function_parameters=cost_function_parameters,
-                                        cost_update_function=cost_update_function)
+                                        cost_update_function=cost_update_function,
+                                        iterative_start_size=iterative_start_size,
+                                        resize_step=resize_step)
 
         # init costs
-        logger.info(inspect.cleandoc("""#
-        ##################################################################################
-        Autonomous Experimenter initialization successfully concluded
-        now train(...) or train_async(...), and then go(...)
-        ##################################################################################"""))
+        logger.info(_INIT_MESSAGE)
 
     ###################################################################################
     def train(self, init_hyperparameters=None, pop_size=10, tol=0.0001, max_iter=20, method="global", constraints=()):
@@ -341,7 +405,7 @@ class AutonomousExperimenterGP:
             See `hgdl.readthedocs.io` for setting up constraints.
         """
 
-        if self.training_dask_client is None: self.training_dask_client = dask.distributed.Client()
+        self._ensure_client("training_dask_client")
 
         logger.info("AutonomousExperimenter starts async training with dask client:")
         self.opt_obj = self.gp_optimizer.train_async(
@@ -372,12 +436,29 @@ class AutonomousExperimenterGP:
         Will be called automatically at the end of go().
         """
         try:
-            self.training_dask_client.close()
-            self.acq_func_opt_dask_client.close()
+            if self.training_dask_client is not None: self.training_dask_client.close()
+            if self.acq_func_opt_dask_client is not None and \
+                    self.acq_func_opt_dask_client is not self.training_dask_client:
+                self.acq_func_opt_dask_client.close()
+            self.training_dask_client = None
+            self.acq_func_opt_dask_client = None
         except Exception as ex:
             logger.error(str(ex))
             logger.error("Killing of the clients failed. Please do so manually before initializing a new one.")
 
+    def _ensure_client(self, attr):
+        # returns the client stored in `attr`, constructing (or sharing) one only if there is none yet
+        client = getattr(self, attr)
+        if client is None:
+            if self.share_dask_client:
+                client = self.training_dask_client
+                if client is None: client = self.acq_func_opt_dask_client
+            if client is None:
+                import dask.distributed as distributed
+                client = distributed.Client()
+            setattr(self, attr, client)
+        return client
+
     def update_hps(self):
         """
         Function to update the hyperparameters if an asynchronous training is running.
@@ -391,8 +472,11 @@ class AutonomousExperimenterGP:
                 "The autonomous experimenter could not find an instance of asynchronous training. Therefore no update.")
         logger.info("hps: {}", self.gp_optimizer.hyperparameters)
 
-    def _tell(self, x, y, v, vp=None):
-        if vp is None:
+    def _tell(self, x, y, v, vp=None, start=0):
+        if vp is None and v is not None and 0 < start < len(x):
+            # the GP already holds the data before `start`, so only the new data is appended
+            self.gp_optimizer.tell(x[start:], y[start:], noise_variances=v[start:], overwrite=False)
+        elif vp is None:
             self.gp_optimizer.tell(x, y, noise_variances=v)
         else:
             self.gp_optimizer.tell(x, y, noise_variances=v, output_positions=vp)
@@ -441,10 +525,87 @@ class AutonomousExperimenterGP:
                 dask_client=dask_client)
         return res
 
-    def _extract_data(self):
-        x, y, v, t, c = self.data.extract_data()
+    @property
+    def noise_variances(self):
+        """the data point observation variances, an alias of `variances`"""
+        return self.variances
+
+    @noise_variances.setter
+    def noise_variances(self, value):
+        self.variances = value
+
+    @property
+    def cost(self):
+        """the measurement costs, an alias of `costs`"""
+        return self.costs
+
+    @cost.setter
+    def cost(self, value):
+        self.costs = value
+
+    def _extract_data(self, start=0):
+        x, y, v, t, c = self.data.extract_data(start)
         return x, y, v, t, c, None
 
+    def _update_data(self, start=0):
+        # only the dataset entries from `start` on are extracted and appended to preallocated buffers;
+        # the data arrays are views of the first n valid rows of these buffers
+        x, y, v, t, c, vp = self._extract_data(start)
+        if start == 0:
+            # fresh buffers, the GP may still reference the old ones
+            self._buffers = dict.fromkeys(("x", "y", "v", "t", "vp"))
+            self.costs = []
+        n = start
+        new_rows = {"x": x, "y": y, "v": v, "t": t, "vp": vp}
+        for key, rows in new_rows.items():
+            if rows is None or (n > 0 and self._buffers[key] is None): self._buffers[key] = None
+            else: self._buffers[key] = _append_rows(self._buffers[key], n, rows)
+        n += len(x)
+        self.x_data, self.y_data, self.variances, self.times, self.vp = \
+            [None if self._buffers[key] is None else self._buffers[key][:n] for key in new_rows]
+        self.costs.extend(c)
+
+    def _measure_async(self, new_data, client):
+        # one instrument call per point; the results are returned in the order they complete
+        import dask.distributed as distributed
+        futures = [client.submit(self.instrument_function, [entry], pure=False) for entry in new_data]
+        measured = []
+        for future in distributed.as_completed(futures): measured.extend(future.result())
+        return measured
+
+    def _retrain(self, retrain_method, pop_size, tol, max_iter):
+        if retrain_method == "async":
+            logger.info("    Starting a new asynchronous training after killing the current one.")
+            self.kill_training()
+            self.train_async(max_iter=10000)
+        elif retrain_method is not None:
+            self.kill_training()
+            logger.info("    Fresh optimization from scratch via {} optimization", retrain_method)
+            self.train(pop_size=pop_size, tol=tol, max_iter=max_iter, method=retrain_method)
+        else:
+            logger.info("    No training in this round but I am trying to update the hyperparameters")
+            self.update_hps()
+        logger.info("    Training successfully concluded")
+
+    def _posterior_std(self, x, func_evals):
+        # the single posterior query per iteration; its result serves the break error and the data info
+        if self.acquisition_function == "variance" and self.gp_optimizer.cost_function is None and \
+                len(func_evals) == len(x):
+            # the acquisition function evaluations already are the posterior variances
+            if len(x) == 1: return np.array([math.sqrt(max(float(func_evals[0]), 0.))])
+            post_var = np.asarray(func_evals)
+        else:
+            post_var = self.gp_optimizer.posterior_covariance(x, variance_only=True)["v(x)"]
+        return np.sqrt(post_var)
+
+    def _write_checkpoint_log(self, checkpoint_log, start):
+        # only the entries from `start` on are written; gpData.inject_checkpoint_log() replays the log
+        try:
+            pickle.dump((start, self.data.dataset[start:]), checkpoint_log, protocol=5)
+            checkpoint_log.flush()
+        except Exception as e:
+            raise RuntimeError("Data not saved") from e
+
     ###################################################################################
     def go(self, N=1e15, breaking_error=1e-50,
            retrain_globally_at=(20, 50, 100, 400, 1000),
@@ -462,7 +623,10 @@ class AutonomousExperimenterGP:
            number_of_suggested_measurements=1,
            checkpoint_filename=None,
            constraints=(),
-           break_condition_callable=lambda n: False
+           break_condition_callable=lambda n: False,
+           train_during_measurement=False,
+           train_on_exit=False,
+           instrument_dask_client=None
            ):
         """
         Function to start the autonomous-data-acquisition loop.
@@ -516,144 +680,177 @@ class AutonomousExperimenterGP:
             optimization method is automatically
             set to use HGDL. The default is 1.
         checkpoint_filename : str, optional
-            When provided, a checkpoint of all the accumulated data will be written to this file on each iteration.
+            When provided, the data collected in each iteration is appended to the checkpoint log
+            `checkpoint_filename + ".pkl"`, and all the accumulated data is written to `checkpoint_filename`
+            (via `np.save`) when the loop concludes. Both files can be used as `dataset` to initialize
+            a new instance.
         constraints : tuple, optional
             If provided, this subjects the acquisition function optimization to constraints.
             For the definition of the constraints, follow
             the structure your chosen optimizer requires.
         break_condition_callable : Callable, optional
             Autonomous loop will stop when this function returns True. The function takes as
-            input a gpcam.AutonomousExperimenterGP instance.
+            input a gpcam.AutonomousExperimenterGP instance. It is called after the new data was communicated
+            to the GP and before the training of that iteration.
+        train_during_measurement : bool, optional
+            If True, a training (global or local) that is due after an iteration is run in a background thread
+            while the `instrument_function` performs the measurements of the next iteration, which hides
+            the training time behind the measurement time. The suggestions of that next iteration are then
+            based on the hyperparameters before the training. The `instrument_function` should not access the GP
+            in that case. The default is False.
+        train_on_exit : bool, optional
+            If True, the training that is due in the last iteration, i.e., when `breaking_error` is reached
+            or `break_condition_callable` returns True, is still performed before the loop stops.
+            The default is False.
+        instrument_dask_client : distributed.client.Client, optional
+            If provided, the suggested points of an iteration are measured in parallel: every point is submitted
+            to this client as a separate `instrument_function` call and the results are collected as they
+            complete. Together with `train_during_measurement`, the training runs while the measurements
+            are in flight. This requires `communicate_full_dataset` = False and an `instrument_function`
+            that can be sent to the dask workers. The default is None, i.e., one `instrument_function`
+            call for all points.
         """
+        if instrument_dask_client is not None and self.communicate_full_dataset:
+            raise ValueError("instrument_dask_client requires communicate_full_dataset = False.")
         # set up
         start_time = time.time()
         start_date_time = time.strftime("%Y-%m-%d_%H_%M_%S", time.localtime())
         logger.info("Starting the autonomous loop...")
+        retrain_globally_at = frozenset(retrain_globally_at)
+        retrain_locally_at = frozenset(retrain_locally_at)
+        retrain_async_at = frozenset(retrain_async_at)
+        update_cost_func_at = frozenset(update_cost_func_at)
         i = 0
         n_measurements = len(self.x_data)
-        # start the loop
-        while n_measurements < N:
-            logger.info("----------------------------")
-            logger.info(f"iteration {i}")
-            logger.info(f"Run Time: {time.time() - start_time} seconds")
-            logger.info(f"Number of measurements {n_measurements}")
-
-            # ask() for new suggestions
-            current_position = self.x_data[-1]
-            logger.info("current hps: {}", self.gp_optimizer.hyperparameters)
-            current_method = acq_func_opt_setting(self)
-            if number_of_suggested_measurements > 1 and current_method != "hgdl": current_method = "global"
-            if current_method == "hgdl" and self.acq_func_opt_dask_client is None: self.acq_func_opt_dask_client = dask.distributed.Client()
-            try:
-                x_out = self.data.dataset[-1]["output positions"]
-            except:
-                x_out = None
-
-            res = self._ask(
-                self.input_space_bounds,
-                position=current_position,
-                x_out=x_out,
-                n=number_of_suggested_measurements,
-                acquisition_function=self.acquisition_function,
-                method=current_method,
-                pop_size=acq_func_opt_pop_size,
-                max_iter=acq_func_opt_max_iter,
-                tol=acq_func_opt_tol,
-                constraints=constraints,
-                dask_client=self.acq_func_opt_dask_client)
-
-            self.acq_func_max_opt_obj = res["opt_obj"]
-            next_measurement_points = res["x"]
-            func_evals = res["f(x)"]
-            if self.data.output_dim:
-                a = np.array(next_measurement_points)
-                b = np.array(self.vp[-1])
-                test_points = np.array([np.append(a[i], b[j]) for i in range(len(a)) for j in range(len(b))])
-                post_var = self.gp_optimizer.posterior_covariance(test_points)["v(x)"]
-            else:
-                post_var = self.gp_optimizer.posterior_covariance(next_measurement_points)["v(x)"]
-            error = np.max(np.sqrt(post_var))
-
-            # adjust tolerances if necessary
-            if acq_func_opt_tol_adjust:
-                acq_func_opt_tol = abs(func_evals[0]) * acq_func_opt_tol_adjust
-                logger.info("acquisition function optimization tolerance changed to: {}", acq_func_opt_tol)
-            logger.info("Next points to be requested: ")
-            logger.info(next_measurement_points)
-            # update and tell() new data
-            info = [{"hyperparameters": self.gp_optimizer.hyperparameters,
-                     "posterior std": np.sqrt(post_var[j])} for j in range(len(next_measurement_points))]
-            new_data = self.data.inject_arrays(next_measurement_points, info=info)
-            logger.info("Sending request to instrument ...")
-            if self.communicate_full_dataset:
-                self.data.dataset = self.instrument_function(self.data.dataset + new_data)
-            else:
-                self.data.dataset = self.data.dataset + self.instrument_function(new_data)
-
-            # receive new data
-            logger.info("Data received")
-            logger.info("Checking if data is clean ...")
-            self.data.check_incoming_data()
-            if self.data.nan_in_dataset(): self.data.clean_data_NaN()
-            # update arrays and the gp_optimizer
-            self.x_data, self.y_data, self.variances, self.times, self.costs, vp = self._extract_data()
-            logger.info("Communicating new data to the GP")
-            self._tell(self.x_data, self.y_data, self.variances, vp)
-
-            # retrain()
-            if any(n in retrain_async_at for n in range(n_measurements, len(self.x_data))) and n_measurements < N:
-                if self.training_dask_client is None: self.training_dask_client = dask.distributed.Client()
-                logger.info("    Starting a new asynchronous training after killing the current one.")
-                self.kill_training()
-                self.train_async(max_iter=10000)
-            elif any(n in retrain_globally_at for n in range(n_measurements, len(self.x_data))) and n_measurements < N:
-                self.kill_training()
-                logger.info("    Fresh optimization from scratch via global optimization")
-                self.train(pop_size=training_opt_pop_size,
-                           tol=training_opt_tol,
-                           max_iter=training_opt_max_iter,
-                           method="global")
-            elif any(n in retrain_locally_at for n in range(n_measurements, len(self.x_data))) and n_measurements < N:
-                self.kill_training()
-                logger.info("    Fresh optimization from scratch via local optimization")
-                self.train(pop_size=training_opt_pop_size,
-                           tol=training_opt_tol,
-                           max_iter=training_opt_max_iter,
-                           method="local")
-            else:
-                logger.info("    No training in this round but I am trying to update the hyperparameters")
-                self.update_hps()
-            logger.info("    Training successfully concluded")
-
-            # run a user-defined callable
-            if self.run_every_iteration is not None: self.run_every_iteration(self)
-
-            # save some data
+        checkpoint_log = None
+        training_executor = ThreadPoolExecutor(max_workers=1) if train_during_measurement else None
+        pending_training = None
+        completed = False
+        try:
             if checkpoint_filename:
+                checkpoint_log = open(checkpoint_filename + ".pkl", "wb")
+                self._write_checkpoint_log(checkpoint_log, 0)
+            # start the loop
+            while n_measurements < N:
+                logger.info("----------------------------")
+                logger.info("iteration {}", i)
+                logger.info("Run Time: {} seconds", time.time() - start_time)
+                logger.info("Number of measurements {}", n_measurements)
+
+                # ask() for new suggestions
+                current_position = self.x_data[-1]
+                logger.info("current hps: {}", self.gp_optimizer.hyperparameters)
+                current_method = acq_func_opt_setting(self)
+                if number_of_suggested_measurements > 1 and current_method != "hgdl": current_method = "global"
+                if current_method == "hgdl": self._ensure_client("acq_func_opt_dask_client")
                 try:
-                    np.save(checkpoint_filename, self.data.dataset)
-                except Exception as e:
-                    raise RuntimeError("Data not saved") from e
+                    x_out = self.data.dataset[-1]["output positions"]
+                except:
+                    x_out = None
+
+                res = self._ask(
+                    self.input_space_bounds,
+                    position=current_position,
+                    x_out=x_out,
+                    n=number_of_suggested_measurements,
+                    acquisition_function=self.acquisition_function,
+                    method=current_method,
+                    pop_size=acq_func_opt_pop_size,
+                    max_iter=acq_func_opt_max_iter,
+                    tol=acq_func_opt_tol,
+                    constraints=constraints,
+                    dask_client=self.acq_func_opt_dask_client)
+
+                self.acq_func_max_opt_obj = res["opt_obj"]
+                next_measurement_points = res["x"]
+                func_evals = res["f(x)"]
+                post_std = self._posterior_std(next_measurement_points, func_evals)
+                error = np.max(post_std)
 
-            # cost update
-            if i in update_cost_func_at: self.gp_optimizer.update_cost_function(self.costs)
+                # adjust tolerances if necessary
+                if acq_func_opt_tol_adjust:
+                    acq_func_opt_tol = float(abs(func_evals[0])) * float(acq_func_opt_tol_adjust)
+                    logger.info("acquisition function optimization tolerance changed to: {}", acq_func_opt_tol)
+                logger.info("Next points to be requested:\n{}", next_measurement_points)
+                # update and tell() new data
+                info = _measurement_info(self.gp_optimizer.hyperparameters, post_std, len(next_measurement_points))
+                new_data = self.data.inject_arrays(next_measurement_points, info=info)
+                training = None
+                if pending_training is not None:
+                    logger.info("Starting the pending training during the measurements")
+                    training = training_executor.submit(pending_training)
+                    pending_training = None
+                logger.info("Sending request to instrument ...")
+                if self.communicate_full_dataset:
+                    # a new list, so that a failing instrument leaves the dataset untouched
+                    self.data.dataset = self.instrument_function(self.data.dataset + new_data)
+                elif instrument_dask_client is not None:
+                    self.data.dataset.extend(self._measure_async(new_data, instrument_dask_client))
+                else:
+                    self.data.dataset.extend(self.instrument_function(new_data))
+                if training is not None: training.result()
 
-            # break check
-            if error < breaking_error: break
-            if break_condition_callable(self): break
+                # receive new data
+                logger.info("Data received")
+                logger.info("Checking if data is clean ...")
+                # only the new entries have to be checked unless the instrument received the full dataset
+                new_data_start = 0 if self.communicate_full_dataset else n_measurements
+                self.data.check_incoming_data(new_data_start)
+                if self.data.nan_in_dataset(new_data_start): self.data.clean_data_NaN(new_data_start)
+                # update arrays and the gp_optimizer
+                self._update_data(new_data_start)
+                logger.info("Communicating new data to the GP")
+                self._tell(self.x_data, self.y_data, self.variances, self.vp, new_data_start)
 
-            # update iteration numbers
-            i += 1
-            n_measurements = len(self.x_data)
+                # break check, before the training so that a final training is only done if requested
+                done = error < breaking_error or break_condition_callable(self)
 
-        # clean up
+                # retrain()
+                n_after = len(self.x_data)
+                if not done or train_on_exit:
+                    retrain_method = _retrain_method(range(n_measurements, n_after),
+                                                     retrain_async_at, retrain_globally_at, retrain_locally_at)
+                    retrain = partial(self._retrain, retrain_method, pop_size=training_opt_pop_size,
+                                      tol=training_opt_tol, max_iter=training_opt_max_iter)
+                    if training_executor is not None and not done and retrain_method in ("global", "local"):
+                        logger.info("    Training deferred to the next measurements")
+                        pending_training = retrain
+                    else:
+                        retrain()
+
+                # run a user-defined callable
+                if self.run_every_iteration is not None: self.run_every_iteration(self)
+
+                # save some data; earlier entries are already in the log, also if the instrument received them
+                if checkpoint_log is not None:
+                    self._write_checkpoint_log(checkpoint_log, n_measurements)
+
+                # cost update
+                if i in update_cost_func_at: self.gp_optimizer.update_cost_function(self.costs)
+
+                if done: break
+
+                # update iteration numbers
+                i += 1
+                n_measurements = n_after
+
+            if pending_training is not None: pending_training()
+            completed = True
+        finally:
+            # also reached if the loop raises, so that no training thread and no open log are left behind
+            if training_executor is not None: training_executor.shutdown()
+            if checkpoint_log is not None:
+                checkpoint_log.close()
+                try:
+                    np.save(checkpoint_filename, self.data.dataset[:len(self.x_data)])
+                except Exception as e:
+                    # an exception of the loop is propagating already and must not be replaced
+                    if completed: raise RuntimeError("Data not saved") from e
+                    logger.error("Data not saved: {}", e)
         logger.info("killing the client... and then we are done")
         self.kill_all_clients()
 
-        logger.info(inspect.cleandoc("""#
-            ====================================================
-            The autonomous experiment was concluded successfully
-            ===================================================="""))
+        logger.info(_CONCLUDED_MESSAGE)
 
 
 ###################################################################################
@@ -694,7 +891,9 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
          A function that takes data points (a list of dicts), and returns the same
          with the measurement data filled in. The function is
          expected to communicate with the instrument and perform measurements,
-         populating fields of the data input.
+         populating fields of the data input. The returned list is appended to the
+         existing dataset (or replaces it if `communicate_full_dataset` is True);
+         filling in the given dictionaries in place and returning the input list is sufficient.
     init_dataset_size : int, optional
         If `x` and `y` are not provided and `dataset` is not provided,
         `init_dataset_size` must be provided. An initial
@@ -770,6 +969,11 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
         newly suggested data points will be communicated. The default is False.
     compute_device : str, optional
         One of "cpu" or "gpu", determines how linear system solves are run. The default is "cpu".
+        For "gpu", pytorch has to be installed manually. It is then used for the linear solves in the
+        gradient of the log-likelihood and for the solves and log-determinants of the information-theoretic
+        acquisition functions; the stored inverse (store_inv) is computed by pytorch on the cpu.
+        The Cholesky factorization of the prior covariance and the posterior mean and variance solves
+        run on the cpu either way.
     store_inv : bool, optional
         If True, the algorithm calculates and stores the inverse of the covariance
         matrix after each training or update of the dataset,
@@ -784,6 +988,11 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
         A Dask Distributed Client instance for distributed `acquisition_function` computation.
         If None is provided, a new
         `dask.distributed.Client` instance is constructed.
+    share_dask_client : bool, optional
+        If True, the training and the `acquisition_function` optimization use the same
+        `dask.distributed.Client` instance, which is the one provided (if only one is provided) or
+        the one constructed first. Note that asynchronous training occupies the workers of its client.
+        The default is False.
     info : bool, optional
         Specifies if info should be displayed. Default = False
 
@@ -829,6 +1038,7 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
                  store_inv=False,
                  training_dask_client=None,
                  acq_func_opt_dask_client=None,
+                 share_dask_client=False,
                  gp2Scale=False,
                  gp2Scale_dask_client=None,
                  gp2Scale_batch_size=10000,
@@ -853,6 +1063,7 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
         self.async_train_in_progress = False
         self.training_dask_client = training_dask_client
         self.acq_func_opt_dask_client = acq_func_opt_dask_client
+        self.share_dask_client = share_dask_client
         self.args = args
 
         if init_dataset_size is None and x_data is None and dataset is None:
@@ -864,7 +1075,8 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
             if instrument_function is None: raise Exception("You need to provide an instrument function.")
             self.data.dataset = self.instrument_function(self.data.dataset)
         elif dataset is not None:
-            self.data.inject_dataset(list(np.load(dataset, allow_pickle=True)))
+            if str(dataset).endswith(".pkl"): self.data.inject_checkpoint_log(dataset)
+            else: self.data.inject_dataset(list(np.load(dataset, allow_pickle=True)))
             self.hyperparameters = self.data.dataset[-1]["hyperparameters"]
         elif x_data is not None and y_data is not None:
             self.data.dataset = self.data.inject_arrays(x_data, y=y_data, v=noise_variances, vp=vp)
@@ -875,7 +1087,7 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
             raise Exception("No viable option for data given!")
         self.data.check_incoming_data()
         if self.data.nan_in_dataset(): self.data.clean_data_NaN()
-        self.x_data, self.y_data, self.noise_variances, self.times, self.costs, self.vp = self.data.extract_data()
+        self._update_data()
         self.init_dataset_size = len(self.x_data)
         ######################
         ######################
@@ -885,7 +1097,7 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
             output_space_dimension=output_dim,
             init_hyperparameters=hyperparameters,
             hyperparameter_bounds=hyperparameter_bounds,
-            noise_variances=self.noise_variances,
+            noise_variances=self.variances,
             compute_device=compute_device,
             gp_kernel_function=kernel_function,
             gp_kernel_function_grad=None,
@@ -904,12 +1116,21 @@ class AutonomousExperimenterFvGP(AutonomousExperimenterGP):
             cost_function_parameters=cost_function_parameters,
             cost_update_function=cost_update_function)
 
-        logger.info(inspect.cleandoc("""#
-        ##################################################################################
-        Autonomous Experimenter fvGP initialization successfully concluded
-        now train(...) or train_async(...), and then go(...)
-        ##################################################################################"""))
+        logger.info(_FVGP_INIT_MESSAGE)
 
-    def _extract_data(self):
-        x, y, v, t, c, vp = self.data.extract_data()
+    def _extract_data(self, start=0):
+        x, y, v, t, c, vp = self.data.extract_data(start)
         return x, y, v, t, c, vp
+
+    def _posterior_std(self, x, func_evals):
+        a = np.asarray(x)
+        b = np.asarray(self.vp[-1])
+        # the test points buffer is reused as long as the number of points and outputs does not change
+        shape = (len(a) * len(b), a.shape[1] + b.shape[1])
+        if getattr(self, "_test_points", None) is None or self._test_points.shape != shape:
+            self._test_points = np.empty(shape)
+        test_points = self._test_points
+        test_points[:, :a.shape[1]] = np.repeat(a, len(b), axis=0)
+        test_points[:, a.shape[1]:] = np.tile(b, (len(a), 1))
+        post_var = self.gp_optimizer.posterior_covariance(test_points, variance_only=True)["v(x)"]
+        return np.sqrt(post_var)
@@ -1,5 +1,6 @@
 import datetime
 import math
+import pickle
 import time
 import uuid
 import warnings
@@ -40,6 +41,21 @@ class gpData:
         self.point_number = len(self.dataset)
         self.dataset = dataset
 
+    def inject_checkpoint_log(self, filename):
+        """
+        initializes a dataset from a checkpoint log written by the autonomous loop
+        the log is a sequence of (start index, entries) records; a truncated last record is ignored
+        """
+        dataset = []
+        with open(filename, "rb") as f:
+            while True:
+                try:
+                    start, entries = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+                dataset[start:] = entries
+        self.inject_dataset(dataset)
+
     def inject_arrays(self, x, y=None, v=None, info=None):
         """
         translates numpy arrays to the data format
@@ -80,49 +96,45 @@ class gpData:
     ################################################################
     ########Extracting##############################################
     ################################################################
-    def extract_data(self):
-        x = self.extract_points_from_data()
-        y = self.extract_y_data_from_data()
-        v = self.extract_variances_from_data()
-        t = self.extract_times_from_data()
-        c = self.extract_costs_from_data()
+    def extract_data(self, start=0):
+        """
+        extracts the data arrays from the dataset entries with index >= start
+        """
+        x = self.extract_points_from_data(start)
+        y = self.extract_y_data_from_data(start)
+        v = self.extract_variances_from_data(start)
+        t = self.extract_times_from_data(start)
+        c = self.extract_costs_from_data(start)
         return x, y, v, t, c
 
-    def extract_points_from_data(self):
+    def extract_points_from_data(self, start=0):
         self.point_number = len(self.dataset)
-        P = np.zeros((self.point_number, self.dim))
-        for idx_data in range(self.point_number):
-            P[idx_data] = self.dataset[idx_data]["x_data"]
-        return P
+        return self._column("x_data", start, (self.dim,))
 
-    def extract_y_data_from_data(self):
+    def extract_y_data_from_data(self, start=0):
         self.point_number = len(self.dataset)
-        M = np.zeros((self.point_number))
-        for idx_data in range(self.point_number):
-            M[idx_data] = self.dataset[idx_data]["y_data"]
-        return M
+        return self._column("y_data", start)
 
-    def extract_variances_from_data(self):
+    def extract_variances_from_data(self, start=0):
         self.point_number = len(self.dataset)
-        Variance = np.zeros((self.point_number))
-        for idx_data in range(self.point_number):
-            if self.dataset[idx_data]["noise variance"] is None: return None
-            Variance[idx_data] = self.dataset[idx_data]["noise variance"]
-        return Variance
+        return self._column("noise variance", start, none_if_missing=True)
 
-    def extract_costs_from_data(self):
+    def extract_costs_from_data(self, start=0):
         self.point_number = len(self.dataset)
         Costs = []
-        for idx in range(self.point_number):
+        for idx in range(start, self.point_number):
             Costs.append(self.dataset[idx]["cost"])
         return Costs
 
-    def extract_times_from_data(self):
+    def extract_times_from_data(self, start=0):
         self.point_number = len(self.dataset)
-        times = np.zeros((self.point_number))
-        for idx_data in range(self.point_number):
-            times[idx_data] = self.dataset[idx_data]["time stamp"]
-        return times
+        return self._column("time stamp", start)
+
+    def _column(self, key, start=0, shape=(), none_if_missing=False):
+        # collects the values of `key` of the entries with index >= start into one array in a single conversion
+        values = [entry[key] for entry in self.dataset[start:]]
+        if none_if_missing and any(value is None for value in values): return None
+        return np.array(values, dtype=float).reshape((len(values),) + shape)
 
     ###############################################################
     #######Creating################################################
@@ -141,9 +153,12 @@ class gpData:
     ###############################################################
     #########Cleaning##############################################
     ###############################################################
-    def check_incoming_data(self):
+    def check_incoming_data(self, start=0):
+        """
+        checks the dataset entries with index >= start
+        """
         try:
-            for entry in self.dataset:
+            for entry in self.dataset[start:]:
                 if entry["y_data"] is None:
                     raise Exception("Entry with no specified y_data in communicated list of data dictionaries")
                 if entry["x_data"] is None:
@@ -153,15 +168,21 @@ class gpData:
                 "Checking the incoming data could not be accomplished. This normally means that wrong formats were "
                 "communicated")
 
-    def clean_data_NaN(self):
-        for entry in self.dataset:
+    def clean_data_NaN(self, start=0):
+        """
+        removes the dataset entries with index >= start that contain NaNs
+        """
+        clean_entries = []
+        for entry in self.dataset[start:]:
             if self._nan_in_dict(entry):
                 warnings.warn("CAUTION, NaN detected in data")
-                self.dataset.remove(entry)
-        self.point_number = len(self.data_set)
+            else:
+                clean_entries.append(entry)
+        self.dataset[start:] = clean_entries
+        self.point_number = len(self.dataset)
 
-    def nan_in_dataset(self):
-        for entry in self.dataset:
+    def nan_in_dataset(self, start=0):
+        for entry in self.dataset[start:]:
             if self._nan_in_dict(entry):
                 return True
         return False
@@ -260,43 +281,42 @@ class fvgpData(gpData):
     ################################################################
     ################################################################
     ################################################################
-    def extract_data(self):
-        x = self.extract_points_from_data()
-        y = self.extract_y_data_from_data()
-        v = self.extract_variances_from_data()
-        t = self.extract_times_from_data()
-        c = self.extract_costs_from_data()
-        vp = self.extract_output_positions_from_data()
+    def extract_data(self, start=0):
+        """
+        extracts the data arrays from the dataset entries with index >= start
+        """
+        x = self.extract_points_from_data(start)
+        y = self.extract_y_data_from_data(start)
+        v = self.extract_variances_from_data(start)
+        t = self.extract_times_from_data(start)
+        c = self.extract_costs_from_data(start)
+        vp = self.extract_output_positions_from_data(start)
         return x, y, v, t, c, vp
 
-    def extract_output_positions_from_data(self):
+    def extract_output_positions_from_data(self, start=0):
         self.point_number = len(self.dataset)
-        VP = np.zeros((self.point_number, self.output_number, self.output_dim))
-        for idx_data in range(self.point_number):
+        VP = np.zeros((self.point_number - start, self.output_number, self.output_dim))
+        for idx_data in range(start, self.point_number):
             if ("output positions" in self.dataset[idx_data]):
-                VP[idx_data] = self.dataset[idx_data]["output positions"]
+                VP[idx_data - start] = self.dataset[idx_data]["output positions"]
             else:
-                VP[idx_data] = self.dataset[idx_data - 1]["output positions"]
+                VP[idx_data - start] = self.dataset[idx_data - 1]["output positions"]
         return VP
 
-    def extract_y_data_from_data(self):
+    def extract_y_data_from_data(self, start=0):
         self.point_number = len(self.dataset)
-        M = np.zeros((self.point_number, self.output_number))
-        for idx_data in range(self.point_number):
-            M[idx_data] = self.dataset[idx_data]["y_data"]
-        return M
+        return self._column("y_data", start, (self.output_number,))
 
-    def extract_variances_from_data(self):
+    def extract_variances_from_data(self, start=0):
         self.point_number = len(self.dataset)
-        Variance = np.zeros((self.point_number, self.output_number))
-        for idx_data in range(self.point_number):
-            if self.dataset[idx_data]["noise variances"] is None: return None
-            Variance[idx_data] = self.dataset[idx_data]["noise variances"]
-        return Variance
+        return self._column("noise variances", start, (self.output_number,), none_if_missing=True)
 
-    def check_incoming_data(self):
+    def check_incoming_data(self, start=0):
+        """
+        checks the dataset entries with index >= start
+        """
         try:
-            for entry in self.dataset:
+            for entry in self.dataset[start:]:
                 if entry["y_data"] is None:
                     raise Exception("Entry with no specified y_data in communicated list of data dictionaries")
                 if entry["x_data"] is None:
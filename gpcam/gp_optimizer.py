@@ -1,12 +1,20 @@
 #!/usr/bin/env python
 
+from collections import OrderedDict
+
 import numpy as np
 from loguru import logger
+from scipy.linalg import cho_solve
 from fvgp import fvGP
 from fvgp import GP
 from . import surrogate_model as sm
 import warnings
 
+# number of posterior covariance results GPOptimizer keeps for repeated queries
+POSTERIOR_COVARIANCE_CACHE_SIZE = 64
+# number of points whose prior covariance block is formed at once in GPOptimizer.posterior_mean_and_variance
+PRIOR_VARIANCE_BLOCK_SIZE = 256
+
 
 # TODO (for fvgp and gpCAM)
 #   variational inference in fvgp
@@ -274,6 +282,14 @@ class GPOptimizer(GP):
         input costs (a list of cost values usually determined by
         `instrument_func`) and a parameter
         object. The default is a no-op.
+    iterative_start_size : int, optional
+        Number of data points from which on the Cholesky factor of the prior covariance is extended
+        by the new rows when data is appended (see :py:meth:`tell` with overwrite=False), instead of
+        being recomputed. This is only possible if the covariance among the existing data points,
+        including their noise, did not change; a noise function or the default noise (which depends on
+        the mean of y_data) usually changes it, in which case the factor is recomputed. The default is 500.
+    resize_step : int, optional
+        Number of rows by which the buffer holding the extended Cholesky factor grows. The default is 200.
 
     Attributes
     ----------
@@ -319,7 +335,9 @@ class GPOptimizer(GP):
             info=False,
             cost_function=None,
             cost_function_parameters=None,
-            cost_update_function=None
+            cost_update_function=None,
+            iterative_start_size=500,
+            resize_step=200
     ):
         if isinstance(x_data, np.ndarray):
             if np.ndim(x_data) == 1: x_data = x_data.reshape(-1, 1)
@@ -328,6 +346,9 @@ class GPOptimizer(GP):
             self.input_dim = 1
             warnings.warn("gpCAM on non-Euclidean inputs is still experimental. Use with caution!")
 
+        self._posterior_covariance_cache = OrderedDict()
+        self._covariance_state = sm.CovarianceState(iterative_start_size=iterative_start_size,
+                                                    resize_step=resize_step)
         super().__init__(
             self.input_dim,
             x_data,
@@ -410,8 +431,8 @@ class GPOptimizer(GP):
         """
         This function can tell() the gp_optimizer class
         the data that was collected. The data will instantly be used to update the gp data.
-        IMPORTANT: This call does not append data. The entire dataset, including the updates,
-        has to be provided.
+        IMPORTANT: By default, this call does not append data. The entire dataset, including the updates,
+        has to be provided. Use overwrite=False to append new data instead.
 
         Parameters
         ----------
@@ -424,8 +445,129 @@ class GPOptimizer(GP):
             If not provided, the GP will 1% of the y values as variances.
         overwrite : bool, optional
             The default is True. Indicates if all previous data should be overwritten.
+            If False, the given data is appended to the existing data. The prior covariance is still
+            assembled in full; its Cholesky factor is extended by the new rows only if the GP holds at
+            least `iterative_start_size` points and the noise of the existing points is unchanged,
+            i.e., the noise variances were given explicitly. Otherwise it is recomputed.
+        """
+        self.update_gp_data(x, y, noise_variances=noise_variances, overwrite=overwrite)
+
+    def update_gp_data(self, x_new, y_new, noise_variances=None, overwrite=False):
+        """
+        Communicates data to the GP (see :py:meth:`fvgp.GP.update_gp_data`)
+        and clears the cached posterior variances.
+        """
+        self._posterior_covariance_cache.clear()
+        super().update_gp_data(x_new, y_new, noise_variances=noise_variances, overwrite=overwrite)
+
+    def _update_GPpriorV(self, x_data_old, x_new, y_data, hyperparameters, calc_inv=False):
+        # fvgp appends the prior mean at x_new to the stored prior mean vector, which is stale for
+        # data-dependent mean functions (the default is the mean of y_data); the mean is re-evaluated
+        # at all data points and, if it changed, y_data - mean is solved again with the new factorization
+        if self.gp2Scale: return self._compute_GPpriorV(self.x_data, y_data, hyperparameters, calc_inv=calc_inv)
+        K, KV, KVinvY, KVlogdet, factorization_obj, KVinv, prior_mean_vec, V = super()._update_GPpriorV(
+            x_data_old, x_new, y_data, hyperparameters, calc_inv=calc_inv)
+        mean = self.mean_function(self.x_data, hyperparameters, self)
+        if not np.array_equal(mean, prior_mean_vec):
+            prior_mean_vec = mean
+            KVinvY = cho_solve(factorization_obj[1:], y_data - prior_mean_vec)
+        return K, KV, KVinvY, KVlogdet, factorization_obj, KVinv, prior_mean_vec, V
+
+    def _compute_gp_linalg(self, vec, KV, calc_inv=False, try_sparse_LU=False):
+        # fvgp factorizes K + V from scratch, also when data was appended (update_gp_data(overwrite=False));
+        # the covariance state extends the previous factor instead if the leading block is unchanged
+        if self.gp2Scale: return super()._compute_gp_linalg(vec, KV, calc_inv=calc_inv, try_sparse_LU=try_sparse_LU)
+        L = self._covariance_state.update(KV)
+        factorization_obj = ("Chol", L, True)
+        KVinvY = cho_solve((L, True), vec)
+        KVlogdet = 2.0 * np.sum(np.log(abs(L.diagonal())))
+        KVinv = self._inv(KV) if calc_inv else None
+        return KVinvY, KVlogdet, factorization_obj, KVinv
+
+    def posterior_covariance(self, x_pred, x_out=None, variance_only=False, add_noise=False, cache=False):
+        """
+        Function to compute the posterior covariance (see :py:meth:`fvgp.GP.posterior_covariance`).
+        On request (cache = True), the variances (variance_only = True) for the last queried point sets
+        are cached, so that repeated queries at the same points with the same hyperparameters and data
+        do not repeat the linear solves. The cache is cleared when data is communicated or the GP is trained.
+
+        Parameters
+        ----------
+        x_pred : np.ndarray
+            A numpy array of shape (V x D), interpreted as  an array of input point positions.
+        x_out : np.ndarray, optional
+            Output coordinates in case of multi-task GP use. Results for x_out are not cached.
+        variance_only : bool, optional
+            If True the computation of the posterior covariance matrix is avoided which can save compute time.
+            In that case the return will only provide the variance at the input points.
+            Default = False.
+        add_noise : bool, optional
+            If True the noise variances will be added to the posterior variances. Default = False.
+        cache : bool, optional
+            If True, variance_only results are looked up in and added to the cache. Only worth it if
+            the same points are queried repeatedly, since the points have to be hashed. Default = False.
+
+        Return
+        ------
+        Solution : dict
         """
-        super().update_gp_data(x, y, noise_variances=noise_variances, overwrite=overwrite)
+        if (not cache or not variance_only or x_out is not None or not isinstance(x_pred, np.ndarray)
+                or x_pred.dtype == object):
+            return super().posterior_covariance(x_pred, x_out=x_out, variance_only=variance_only, add_noise=add_noise)
+        key = (np.asarray(self.hyperparameters).tobytes(), x_pred.dtype.str, x_pred.shape, x_pred.tobytes(),
+               add_noise)
+        if key in self._posterior_covariance_cache:
+            self._posterior_covariance_cache.move_to_end(key)
+            res = self._posterior_covariance_cache[key]
+        else:
+            res = super().posterior_covariance(x_pred, variance_only=True, add_noise=add_noise)
+            # the result refers to x_pred, which the caller may modify later
+            res = dict(res, x=np.copy(x_pred))
+            self._posterior_covariance_cache[key] = res
+            if len(self._posterior_covariance_cache) > POSTERIOR_COVARIANCE_CACHE_SIZE:
+                self._posterior_covariance_cache.popitem(last=False)
+        # copies, so that callers can modify the results without corrupting the cache
+        return {k: np.copy(v) if isinstance(v, np.ndarray) else v for k, v in res.items()}
+
+    def posterior_mean_and_variance(self, x_pred, x_out=None):
+        """
+        Computes the posterior mean and the posterior variances at the same points, as needed
+        by several acquisition functions. The cross covariances between the data and x_pred are
+        computed once for both, and the prior covariance among the points in x_pred is never formed.
+
+        Parameters
+        ----------
+        x_pred : np.ndarray
+            A numpy array of shape (V x D), interpreted as  an array of input point positions.
+        x_out : np.ndarray, optional
+            Output coordinates in case of multi-task GP use.
+
+        Return
+        ------
+        Solution points, posterior mean and posterior variances : {"x": x_pred, "f(x)": mean, "v(x)": variances}
+        """
+        if not self.non_Euclidean:
+            if np.ndim(x_pred) == 1: raise Exception("x_pred has to be a 2d numpy array, not 1d")
+            if x_out is not None: x_pred = self._cartesian_product_euclid(x_pred, x_out)
+            if len(x_pred[0]) != self.input_space_dim: raise Exception(
+                "Wrong dimensionality of the input points x_pred.")
+        elif x_out is not None:
+            raise Exception("Multi-task GPs on non-Euclidean spaces not implemented yet.")
+
+        hps = self.hyperparameters
+        k = self.kernel(self.x_data, x_pred, hps, self)
+        m = self.mean_function(x_pred, hps, self) + k.T @ self.KVinvY
+        # the prior variances, in blocks so that only small blocks of the prior covariance are formed
+        b = PRIOR_VARIANCE_BLOCK_SIZE
+        prior_v = np.concatenate([np.diag(self.kernel(x_pred[i:i + b], x_pred[i:i + b], hps, self))
+                                  for i in range(0, len(x_pred), b)])
+        v = prior_v - np.sum(k * self._KVsolve(k), axis=0)
+        if np.any(v < -0.001):
+            logger.warning("Negative variances encountered. That normally means that the model is unstable.")
+            v[v < 0.0] = 0.0
+        return {"x": x_pred,
+                "f(x)": m,
+                "v(x)": v}
 
     ##############################################################
     def train(
@@ -525,6 +667,7 @@ class GPOptimizer(GP):
             global_optimizer=global_optimizer,
             constraints=constraints,
             dask_client=dask_client)
+        self._posterior_covariance_cache.clear()
 
         return self.hyperparameters
 
@@ -649,6 +792,7 @@ class GPOptimizer(GP):
         """
 
         hps = super().update_hyperparameters(opt_obj)
+        self._posterior_covariance_cache.clear()
         return hps
 
     ##############################################################
@@ -666,7 +810,9 @@ class GPOptimizer(GP):
             x0=None,
             vectorized=True,
             info=False,
-            dask_client=None):
+            dask_client=None,
+            kriging_believer=False,
+            parallel_workers=1):
         """
         Given that the acquisition device is at "position", this function `ask()`s for
         "n" new optimal points within certain "bounds" and using the optimization setup: "method",
@@ -746,7 +892,9 @@ class GPOptimizer(GP):
         x0 : np.ndarray, optional
             A set of points as numpy array of shape N x D,
             used as starting location(s) for the optimization
-            algorithms. The default is None.
+            algorithms. The default is None. For method = `local`, one local optimization is run
+            from every point; if the optional greenlet package is installed (`pip install gpcam[multistart]`),
+            the runs evaluate point-wise acquisition functions jointly.
         vectorized : bool, optional
             If your acquisition function is vectorized to return the 
             solution to an array of inquiries as an array,
@@ -761,6 +909,17 @@ class GPOptimizer(GP):
             A Dask Distributed Client instance for distributed
             `acquisition_function` optimization. If None is provided,
             a new :py:class:`distributed.client.Client` instance is constructed for hgdl.
+        kriging_believer : bool, optional
+            If True and n > 1, the n suggestions are found one after another (Kriging believer):
+            after every suggestion, the posterior mean at the suggestion is told to the GP as
+            a hallucinated measurement and the acquisition function is maximized again, which
+            yields a diverse batch for any acquisition function and method.
+            The original data is restored before returning. The default is False.
+        parallel_workers : int, optional
+            Number of processes that evaluate the population of the `global` optimizer in parallel
+            (-1 uses all cores). Only used if the acquisition function is not evaluated vectorized,
+            e.g. for n > 1; the GPOptimizer and the acquisition function then have to be picklable.
+            The default is 1.
 
         Return
         ------
@@ -768,6 +927,12 @@ class GPOptimizer(GP):
             Found maxima of the acquisition function, the associated function values and optimization object
             that, only in case of `method` = `hgdl` can be queried for solutions.
         """
+        if n > 1 and kriging_believer:
+            return self._ask_kriging_believer(
+                n, bounds=bounds, candidates=candidates, position=position,
+                acquisition_function=acquisition_function, method=method, pop_size=pop_size,
+                max_iter=max_iter, tol=tol, constraints=constraints, x0=x0, vectorized=vectorized,
+                info=info, dask_client=dask_client, parallel_workers=parallel_workers)
 
         logger.info("ask() initiated with hyperparameters: {}", self.hyperparameters)
         logger.info("optimization method: {}", method)
@@ -815,11 +980,31 @@ class GPOptimizer(GP):
             candidates=candidates,
             vectorized=vectorized,
             info=info,
-            dask_client=dask_client)
+            dask_client=dask_client,
+            parallel_workers=parallel_workers)
         if n > 1: return {'x': maxima.reshape(-1, self.input_space_dim), "f(x)": np.array(func_evals),
                           "opt_obj": opt_obj}
         return {'x': np.array(maxima), "f(x)": np.array(func_evals), "opt_obj": opt_obj}
 
+    def _ask_kriging_believer(self, n, **ask_kwargs):
+        x_data, y_data = np.copy(self.x_data), np.copy(self.y_data)
+        # without a noise function, the GP holds the given noise variances on the diagonal of V
+        noise_variances = None if callable(self.noise_function) else np.copy(np.diag(self.V))
+        hallucinated_variance = None if noise_variances is None else np.mean(noise_variances)
+        maxima = []
+        func_evals = []
+        try:
+            for i in range(n):
+                res = self.ask(n=1, **ask_kwargs)
+                maxima.append(res["x"][0])
+                func_evals.append(res["f(x)"][0])
+                if i == n - 1: break
+                v = None if hallucinated_variance is None else np.full(len(res["x"]), hallucinated_variance)
+                self.tell(res["x"], self.posterior_mean(res["x"])["f(x)"], noise_variances=v, overwrite=False)
+        finally:
+            self.tell(x_data, y_data, noise_variances=noise_variances)
+        return {'x': np.array(maxima), "f(x)": np.array(func_evals), "opt_obj": None}
+
     ##############################################################
     def update_cost_function(self, measurement_costs):
         """
@@ -1304,6 +1489,8 @@ class fvGPOptimizer(fvGP):
         super().update_gp_data(x, y, noise_variances=noise_variances,
                                output_positions=output_positions, overwrite=overwrite)
 
+    posterior_mean_and_variance = GPOptimizer.posterior_mean_and_variance
+
     ##############################################################
     def train(self,
               objective_function=None,
@@ -1,16 +1,31 @@
 #!/usr/bin/env python
 import itertools
 from functools import partial
-import math
 import numpy as np
 from loguru import logger
 import random
 from hgdl.hgdl import HGDL
+from scipy.linalg import cholesky, solve_triangular
 from scipy.optimize import differential_evolution as devo, minimize
-from scipy.stats import norm
+from scipy.special import erf, ndtr
 from functools import partial
 import warnings
 
+try:
+    from greenlet import greenlet
+except ImportError:
+    greenlet = None
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# acquisition functions that are evaluated independently at every point of a batch
+POINTWISE_ACQUISITION_FUNCTIONS = ("variance", "ucb", "lcb", "maximum", "minimum", "gradient",
+                                   "probability of improvement", "expected improvement", "target probability")
+# acquisition functions that compare against the best measurement so far
+IMPROVEMENT_ACQUISITION_FUNCTIONS = ("probability of improvement", "expected improvement")
+
 
 ##########################################################################
 def find_acquisition_function_maxima(gp, acquisition_function,
@@ -29,27 +44,31 @@ def find_acquisition_function_maxima(gp, acquisition_function,
                                      candidates=None,
                                      x_out=None,
                                      dask_client=None,
-                                     info=False):
+                                     info=False,
+                                     parallel_workers=1):
 
     if candidates is None and optimization_bounds is None:
         raise Exception("optimization bounds or candidates have to be provided")
     bounds = optimization_bounds
     opt_obj = None
 
-    func = partial(evaluate_acquisition_function, gp=gp, acquisition_function=acquisition_function,
+    ##the best measurement does not change during the optimization
+    last_best = float(np.max(gp.y_data)) if acquisition_function in IMPROVEMENT_ACQUISITION_FUNCTIONS else None
+    acq_func = resolve_acquisition_function(acquisition_function, x_out, last_best)
+    func = partial(evaluate_acquisition_function, gp=gp, acquisition_function=acq_func,
                    origin=origin, number_of_maxima_sought=number_of_maxima_sought,
                    cost_function=cost_function, cost_function_parameters=cost_function_parameters, x_out=x_out)
-    grad = partial(gradient, func=func)
-
-    logger.info("====================================")
-    logger.info(f"Finding acquisition function maxima via {optimization_method} method")
-    logger.info("tolerance: {}", optimization_tol)
-    logger.info("population size: {}", optimization_pop_size)
-    logger.info("maximum number of iterations: {}", optimization_max_iter)
-    logger.info("bounds: {}")
-    logger.info(bounds)
-    logger.info("cost function parameters: {}", cost_function_parameters)
-    logger.info("====================================")
+    ##for the evaluations that are known to be on 2d arrays of points
+    batch_func = partial(evaluate_acquisition_function_batch, gp=gp, acquisition_function=acq_func,
+                         origin=origin, cost_function=cost_function, cost_function_parameters=cost_function_parameters)
+    pointwise = acquisition_function in POINTWISE_ACQUISITION_FUNCTIONS
+    grad = partial(gradient, func=batch_func if pointwise else func, batched=pointwise)
+
+    if info:
+        logger.info("Finding acquisition function maxima via {} method: tolerance: {}, population size: {}, "
+                    "maximum number of iterations: {}, bounds:\n{}\ncost function parameters: {}",
+                    optimization_method, optimization_tol, optimization_pop_size, optimization_max_iter,
+                    bounds, cost_function_parameters)
     if candidates is not None:
         if not callable(acquisition_function): warnings.warn("It is recommended to use a custom acquisition \
         function for solutions on candidate sets. Proceed with caution.")
@@ -61,23 +80,23 @@ def find_acquisition_function_maxima(gp, acquisition_function,
             length = min(number_of_maxima_sought, len(res))
             opti, func_eval, opt_obj = candidates[0:length], res[0:length], None
         elif isinstance(candidates, list):
-            #choices1 = random.sample(candidates, k=min(number_of_maxima_sought * 100, len(candidates)))
-            #choices = [[choices1[i]] for i in range(len(choices1))]
-            res = np.asarray(list(map(func, candidates))).reshape(len(candidates))
+            ##a point-wise acquisition function evaluates the whole list in one call;
+            ##on Euclidean spaces the GP expects the candidates as one 2d array
+            if acquisition_function in POINTWISE_ACQUISITION_FUNCTIONS:
+                res = np.asarray(func(candidates if gp.non_Euclidean else np.asarray(candidates)))
+            else: res = np.asarray(list(map(func, candidates)))
+            res = res.reshape(len(candidates))
             sort_indices = np.argsort(res)
             res = res[sort_indices]
-            #sorted_choices = [choices[sort_index] for sort_index in sort_indices]
-            sorted_candidates = [candidates[sort_index] for sort_index in sort_indices]
-            candidates = sorted_candidates
+            candidates = [candidates[sort_index] for sort_index in sort_indices]
             length = min(number_of_maxima_sought, len(candidates))
             opti, func_eval, opt_obj = np.asarray(candidates[0:length]), res[0:length], None
-            print(opti)
         else:
             raise Exception("Candidates, if provided, have to be a list or a 2d np.ndarray.")
 
     elif optimization_method == "global":
         opti, func_eval = differential_evolution(
-            func,
+            batch_func if vectorized else func,
             optimization_bounds,
             tol=optimization_tol,
             x0=optimization_x0,
@@ -85,7 +104,8 @@ def find_acquisition_function_maxima(gp, acquisition_function,
             max_iter=optimization_max_iter,
             constraints=constraints,
             vectorized=vectorized,
-            disp=info
+            disp=info,
+            workers=parallel_workers
         )
         opti = np.asarray(opti)
         func_eval = np.asarray(func_eval)
@@ -122,35 +142,29 @@ def find_acquisition_function_maxima(gp, acquisition_function,
         func_eval = np.zeros((1))
 
     elif optimization_method == "local":
+        ##every row of a 2d optimization_x0 is used as a starting point
         if optimization_x0 is not None and np.ndim(optimization_x0) == 1:
-            x0 = optimization_x0
+            x0s = np.array([optimization_x0])
         elif optimization_x0 is not None and np.ndim(optimization_x0) == 2:
-            x0 = optimization_x0[0]
+            x0s = np.asarray(optimization_x0)
+        else:
+            x0s = np.random.uniform(low=bounds[:, 0], high=bounds[:, 1], size=(1, len(bounds)))
+        local_options = dict(method="L-BFGS-B", bounds=bounds, constraints=constraints, tol=optimization_tol,
+                             options={"maxiter": optimization_max_iter})
+        if len(x0s) > 1 and greenlet is not None and pointwise:
+            results = multistart_minimize(batch_func, x0s, **local_options)
+        else:
+            results = [minimize(func, x0, jac=grad, **local_options) for x0 in x0s]
+        successful = [a for a in results if a["success"]]
+        if successful:
+            a = min(successful, key=lambda a: float(a["fun"]))
+            opti = np.array([a["x"]])
+            func_eval = np.array(a["fun"]).reshape(1)
         else:
-            x0 = np.random.uniform(low=bounds[:, 0], high=bounds[:, 1], size=len(bounds))
-        a = minimize(
-            func,
-            x0,
-            method="L-BFGS-B",
-            jac=grad,
-            bounds=bounds,
-            constraints=constraints,
-            tol=optimization_tol,
-            callback=None,
-            options={"maxiter": optimization_max_iter}
-        )
-        opti = np.array([a["x"]])
-        func_eval = np.array(a["fun"])
-        if np.ndim(func_eval) == 0: func_eval = np.array([func_eval])
-        if a["success"] is False:
             logger.warning(
                 "local acquisition function optimization not successful, solution replaced with random point.")
-            opti = np.array(x0)
-            if opti.ndim != 2: opti = np.array([opti])
-            func_eval = evaluate_acquisition_function(x0,
-                                                      gp, acquisition_function, origin,
-                                                      cost_function, cost_function_parameters)
-            if np.ndim(func_eval) != 1: func_eval = np.array([func_eval])
+            opti = np.array([x0s[0]])
+            func_eval = np.asarray(func(x0s[0])).reshape(1)
 
     else:
         raise ValueError("Invalid acquisition function optimization method given.")
@@ -189,106 +203,242 @@ def evaluate_acquisition_function(x, gp=None, acquisition_function=None, origin=
         return obj_eval
 
 
+def evaluate_acquisition_function_batch(x, gp=None, acquisition_function=None, origin=None,
+                                        cost_function=None, cost_function_parameters=None):
+    ##evaluate_acquisition_function for a 2d array x and an acquisition function resolved to a callable
+    ##(see resolve_acquisition_function), without the per-call checks and reshaping
+    if cost_function is not None and origin is not None:
+        return -acquisition_function(x, gp) / cost_function(origin, x, cost_function_parameters)
+    return -acquisition_function(x, gp)
+
+
 def evaluate_gp_acquisition_function(x, acquisition_function, gp, number_of_maxima_sought, x_out):
     ##this function will always spit out a 1d numpy array
     ##for certain functions, this array will only have one entry
     ##for the other the length == len(x)
     if isinstance(x, np.ndarray) and np.ndim(x) == 1: raise Exception(
         "1d array given in evaluate_gp_acquisition_function.")
-    if x_out is None:
-        if acquisition_function == "variance":
-            res = gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"]
-            return res
-        elif acquisition_function == "relative information entropy":
-            res = -gp.gp_relative_information_entropy(x, x_out=x_out)["RIE"]
-            return np.array([res])
-        elif acquisition_function == "relative information entropy set":
-            res = -gp.gp_relative_information_entropy_set(x, x_out=x_out)["RIE"]
-            return res
-        elif acquisition_function == "ucb":
-            m = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            v = gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"]
-            return m + 3.0 * np.sqrt(v)
-        elif acquisition_function == "lcb":
-            m = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            v = gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"]
-            return -(m - 3.0 * np.sqrt(v))
-        elif acquisition_function == "maximum":
-            res = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            return res
-        elif acquisition_function == "gradient":
-            mean_grad = gp.posterior_mean_grad(x, x_out=x_out)["df/dx"]
-            std = np.sqrt(gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"])
-            res = np.linalg.norm(mean_grad, axis=1) * std
-            return res
-        elif acquisition_function == "minimum":
-            res = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            return -res
-        elif acquisition_function == "probability of improvement":
-            m = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            std = np.sqrt(gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"])
-            last_best = np.max(gp.y_data)
-            return norm.cdf((m - last_best) / (std + 1e-9))
-        elif acquisition_function == "total correlation":
-            return -np.array([gp.gp_total_correlation(x, x_out=x_out)["total correlation"]])
-        elif acquisition_function == "expected improvement":
-            m = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            std = np.sqrt(gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"])
-            last_best = np.max(gp.y_data)
-            a = (m - last_best)
-            a[a < 0.] = 0.
-            gamma = a / (std + 1e-9)
-            pdf = norm.pdf(gamma)
-            cdf = norm.cdf(gamma)
-            return std * (gamma * cdf + pdf)
-        elif acquisition_function == "target probability":
-            try:
-                a = gp.args["a"]
-                b = gp.args["b"]
-            except:
-                raise Exception("Reading the arguments for acq func `target probability` failed.")
-            mean = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            cov = gp.posterior_covariance(x, x_out=x_out)["v(x)"] + 1e-9
-            result = np.zeros((len(x)))
-            for i in range(len(x)):
-                result[i] = 0.5 * (math.erf((b - mean[i]) / np.sqrt(2. * cov[i]))) - math.erf(
-                (a - mean[i]) / np.sqrt(2. * cov[i]))
-            return result
-        else:
-            raise Exception("No valid acquisition function string provided.")
+    return resolve_acquisition_function(acquisition_function, x_out)(x, gp)
 
-    else:
-        if acquisition_function == "variance":
-            res = gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"]
-            return np.sum(res.reshape(len(x), len(x_out), order="F"), axis=1)
-        elif acquisition_function == "relative information entropy":
-            res = -gp.gp_relative_information_entropy(x, x_out=x_out)["RIE"]
-            return np.array([res])
-        elif acquisition_function == "relative information entropy set":
-            res = -gp.gp_relative_information_entropy_set(x, x_out=x_out)["RIE"]
-            return np.sum(res.reshape(len(x), len(x_out), order="F"), axis=1)
-        elif acquisition_function == "total correlation":
-            return -np.array([gp.gp_total_correlation(x, x_out=x_out)["total correlation"]])
-        elif acquisition_function == "ucb":
-            m = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            av_m = np.sum(m.reshape(len(x), len(x_out), order="F"), axis=1)
-            v = gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"]
-            av_v = np.sum(v.reshape(len(x), len(x_out), order="F"), axis=1)
-            return av_m + 3.0 * np.sqrt(av_v)
-        elif acquisition_function == "expected improvement":
-            m = gp.posterior_mean(x, x_out=x_out)["f(x)"]
-            m = np.sum(m.reshape(len(x), len(x_out), order="F"), axis=1)
-            std = np.sqrt(gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"])
-            std = np.sum(std.reshape(len(x), len(x_out), order="F"), axis=1)
-            last_best = np.max(gp.y_data)
-            a = (m - last_best)
-            a[a < 0.] = 0.
-            gamma = a / (std + 1e-9)
-            pdf = norm.pdf(gamma)
-            cdf = norm.cdf(gamma)
-            return std * (gamma * cdf + pdf)
+
+def resolve_acquisition_function(acquisition_function, x_out=None, last_best=None):
+    ##returns the callable f(x, gp) behind an acquisition function string, so that the string is only
+    ##dispatched once per optimization; callables are returned unchanged
+    ##last_best, if given, is used by the improvement-based functions instead of max(gp.y_data)
+    if callable(acquisition_function): return acquisition_function
+    acquisition_functions = ACQUISITION_FUNCTIONS if x_out is None else ACQUISITION_FUNCTIONS_X_OUT
+    if acquisition_function not in acquisition_functions:
+        raise Exception("No valid acquisition function string provided.")
+    if acquisition_function in IMPROVEMENT_ACQUISITION_FUNCTIONS:
+        return partial(acquisition_functions[acquisition_function], x_out=x_out, last_best=last_best)
+    return partial(acquisition_functions[acquisition_function], x_out=x_out)
+
+
+def _sum_over_outputs(res, x, x_out):
+    return np.sum(res.reshape(len(x), len(x_out), order="F"), axis=1)
+
+
+def _variance(x, gp, x_out=None):
+    return gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"]
+
+
+def _variance_x_out(x, gp, x_out=None):
+    return _sum_over_outputs(_variance(x, gp, x_out), x, x_out)
+
+
+def _relative_information_entropy(x, gp, x_out=None):
+    return np.array([-gp.gp_relative_information_entropy(x, x_out=x_out)["RIE"]])
+
+
+def _relative_information_entropy_set(x, gp, x_out=None):
+    return -gp.gp_relative_information_entropy_set(x, x_out=x_out)["RIE"]
+
+
+def _relative_information_entropy_set_x_out(x, gp, x_out=None):
+    return _sum_over_outputs(_relative_information_entropy_set(x, gp, x_out), x, x_out)
+
+
+def _total_correlation(x, gp, x_out=None):
+    return -np.array([gp.gp_total_correlation(x, x_out=x_out)["total correlation"]])
+
+
+def _ucb(x, gp, x_out=None):
+    res = gp.posterior_mean_and_variance(x, x_out=x_out)
+    m, v = res["f(x)"], res["v(x)"]
+    return m + 3.0 * np.sqrt(v)
+
+
+def _ucb_x_out(x, gp, x_out=None):
+    res = gp.posterior_mean_and_variance(x, x_out=x_out)
+    m, v = res["f(x)"], res["v(x)"]
+    return _sum_over_outputs(m, x, x_out) + 3.0 * np.sqrt(_sum_over_outputs(v, x, x_out))
+
+
+def _lcb(x, gp, x_out=None):
+    res = gp.posterior_mean_and_variance(x, x_out=x_out)
+    m, v = res["f(x)"], res["v(x)"]
+    return -(m - 3.0 * np.sqrt(v))
+
+
+def _maximum(x, gp, x_out=None):
+    return gp.posterior_mean(x, x_out=x_out)["f(x)"]
+
+
+def _minimum(x, gp, x_out=None):
+    return -gp.posterior_mean(x, x_out=x_out)["f(x)"]
+
+
+def _gradient(x, gp, x_out=None):
+    mean_grad = gp.posterior_mean_grad(x, x_out=x_out)["df/dx"]
+    std = np.sqrt(gp.posterior_covariance(x, x_out=x_out, variance_only=True)["v(x)"])
+    return np.linalg.norm(mean_grad, axis=1) * std
+
+
+def _probability_of_improvement(x, gp, x_out=None, last_best=None):
+    res = gp.posterior_mean_and_variance(x, x_out=x_out)
+    m, v = res["f(x)"], res["v(x)"]
+    std = np.sqrt(v)
+    if last_best is None: last_best = np.max(gp.y_data)
+    return ndtr((m - last_best) / (std + 1e-9))
+
+
+def _standard_normal_pdf(x):
+    return np.exp(-0.5 * x * x) * (1. / np.sqrt(2. * np.pi))
+
+
+def _improvement(m, std, last_best):
+    a = np.maximum(m - last_best, 0.)
+    gamma = a / (std + 1e-9)
+    pdf = _standard_normal_pdf(gamma)
+    cdf = ndtr(gamma)
+    return std * (gamma * cdf + pdf)
+
+
+def _expected_improvement(x, gp, x_out=None, last_best=None):
+    res = gp.posterior_mean_and_variance(x, x_out=x_out)
+    m, v = res["f(x)"], res["v(x)"]
+    if last_best is None: last_best = np.max(gp.y_data)
+    return _improvement(m, np.sqrt(v), last_best)
+
+
+def _expected_improvement_x_out(x, gp, x_out=None, last_best=None):
+    res = gp.posterior_mean_and_variance(x, x_out=x_out)
+    m, v = res["f(x)"], res["v(x)"]
+    if last_best is None: last_best = np.max(gp.y_data)
+    return _improvement(_sum_over_outputs(m, x, x_out), _sum_over_outputs(np.sqrt(v), x, x_out), last_best)
+
+
+def _target_probability(x, gp, x_out=None):
+    try:
+        a = gp.args["a"]
+        b = gp.args["b"]
+    except:
+        raise Exception("Reading the arguments for acq func `target probability` failed.")
+    res = gp.posterior_mean_and_variance(x, x_out=x_out)
+    mean, cov = res["f(x)"], res["v(x)"]
+    cov = cov + 1e-9
+    sqrt2cov = np.sqrt(2. * cov)
+    return 0.5 * (erf((b - mean) / sqrt2cov) - erf((a - mean) / sqrt2cov))
+
+
+ACQUISITION_FUNCTIONS = {
+    "variance": _variance,
+    "relative information entropy": _relative_information_entropy,
+    "relative information entropy set": _relative_information_entropy_set,
+    "ucb": _ucb,
+    "lcb": _lcb,
+    "maximum": _maximum,
+    "gradient": _gradient,
+    "minimum": _minimum,
+    "probability of improvement": _probability_of_improvement,
+    "total correlation": _total_correlation,
+    "expected improvement": _expected_improvement,
+    "target probability": _target_probability}
+
+ACQUISITION_FUNCTIONS_X_OUT = {
+    "variance": _variance_x_out,
+    "relative information entropy": _relative_information_entropy,
+    "relative information entropy set": _relative_information_entropy_set_x_out,
+    "total correlation": _total_correlation,
+    "ucb": _ucb_x_out,
+    "expected improvement": _expected_improvement_x_out}
+
+
+def cholesky_append(L, K12, K22, out=None):
+    ##extends the lower triangular factor L of K11 to the factor of [[K11, K12], [K12^T, K22]]
+    ##for k new rows in O(N^2 k) instead of refactoring in O(N^3);
+    ##the result is written to the leading block of `out` if given, which may already hold L
+    L12 = solve_triangular(L, K12, lower=True)
+    L22 = cholesky(K22 - L12.T @ L12, lower=True)
+    n, k = K12.shape
+    L_new = np.zeros((n + k, n + k)) if out is None else out[:n + k, :n + k]
+    L_new[:n, :n] = L
+    L_new[:n, n:] = 0.
+    L_new[n:, :n] = L12.T
+    L_new[n:, n:] = L22
+    return L_new
+
+
+class CovarianceState:
+    """
+    Keeps the Cholesky factor of a growing covariance matrix.
+    If the leading block of a new matrix with at least `iterative_start_size` rows equals the
+    previously factored matrix, the new rows are appended to the previous factor in O(N^2 k);
+    otherwise the factor is recomputed.
+    Appended factors are stored in a buffer that grows in steps of `resize_step` rows.
+    Factors returned earlier stay valid: appending only writes rows and columns beyond them,
+    and recomputing allocates a new buffer.
+    """
+
+    def __init__(self, iterative_start_size=500, resize_step=200):
+        self.iterative_start_size = iterative_start_size
+        self.resize_step = resize_step
+        self.L_buf = np.zeros((0, 0))
+        self.n = 0
+        self.K = None
+
+    @property
+    def L(self):
+        return self.L_buf[:self.n, :self.n]
+
+    def update(self, K):
+        """
+        updates the factor to the covariance matrix K and returns it (lower triangular)
+        """
+        n_new = len(K)
+        if self.n < n_new and n_new >= self.iterative_start_size and np.array_equal(K[:self.n, :self.n], self.K):
+            self._reserve(n_new)
+            cholesky_append(self.L, K[:self.n, self.n:], K[self.n:, self.n:], out=self.L_buf)
         else:
-            raise Exception("No valid acquisition function string provided.")
+            self.L_buf = cholesky(K, lower=True)
+        self.n = n_new
+        # only a reference, K is not modified by the GP
+        self.K = K
+        return self.L
+
+    def _reserve(self, n):
+        if n > len(self.L_buf):
+            cap = n + self.resize_step
+            L_buf = np.zeros((cap, cap))
+            L_buf[:self.n, :self.n] = self.L
+            self.L_buf = L_buf
+
+
+def anisotropic_squared_exponential_kernel(x1, x2, hyperparameters, obj=None):
+    ##hyperparameters[0] * exp(-0.5 * d^2) with d the distance scaled by the length scales hyperparameters[1:]
+    ##usable as kernel_function; the squared distances come from one matrix product and the exponential
+    ##is evaluated multithreaded by numexpr if it is installed
+    length_scales = np.asarray(hyperparameters[1:1 + x1.shape[1]])
+    a = x1 / length_scales
+    b = x2 / length_scales
+    d2 = np.sum(a * a, axis=1)[:, None] + np.sum(b * b, axis=1)[None, :] - 2. * (a @ b.T)
+    np.maximum(d2, 0., out=d2)
+    s = float(hyperparameters[0])
+    if numexpr is not None: return numexpr.evaluate("s * exp(-0.5 * d2)", local_dict={"s": s, "d2": d2})
+    d2 *= -0.5
+    np.exp(d2, out=d2)
+    d2 *= s
+    return d2
 
 
 def differential_evolution(func,
@@ -299,10 +449,15 @@ def differential_evolution(func,
                            x0=None,
                            constraints=(),
                            disp=False,
-                           vectorized=True):
+                           vectorized=True,
+                           workers=1):
+    ##workers != 1 evaluates the population in parallel processes (func has to be picklable);
+    ##scipy only allows this for non-vectorized evaluations, a vectorized evaluation stays in this process
+    if vectorized: workers = 1
     res = devo(partial(acq_function_vectorization_wrapper, func=func, vectorized=vectorized), bounds, tol=tol, x0=x0,
                maxiter=max_iter, popsize=popsize, polish=False, disp=disp, constraints=constraints,
-               vectorized=vectorized)
+               vectorized=vectorized, workers=workers,
+               updating="deferred" if vectorized or workers != 1 else "immediate")
     return [list(res["x"])], list([res["fun"]])
 
 
@@ -314,11 +469,46 @@ def acq_function_vectorization_wrapper(x, func=None, vectorized=False):
     return acq
 
 
-def gradient(x, func=None):
-    epsilon = 1e-6
-    gradient = np.zeros((len(x)))
-    for i in range(len(x)):
-        new_point = np.array(x)
-        new_point[i] += epsilon
-        gradient[i] = (func(new_point) - func(x)) / epsilon
-    return gradient
+def multistart_minimize(func, x0s, epsilon=1e-6, **kwargs):
+    ##runs one scipy.optimize.minimize per starting point in x0s cooperatively (via greenlets):
+    ##every run is suspended when it requests an evaluation and the pending points of all runs, together with
+    ##their central-difference perturbations, are evaluated in one call of func;
+    ##this requires a point-wise acquisition function
+    driver = greenlet.getcurrent()
+
+    def run(x0):
+        def fun(x): return driver.switch(x)
+        return minimize(fun, x0, jac=True, **kwargs)
+
+    runs = [greenlet(partial(run, x0)) for x0 in x0s]
+    results = [None] * len(runs)
+    requests = {}
+    for i in range(len(runs)): requests[i] = runs[i].switch()
+    while True:
+        for i in [i for i in requests if not isinstance(requests[i], np.ndarray)]:
+            results[i] = requests.pop(i)
+        if not requests: break
+        indices = list(requests)
+        x = np.array([requests[i] for i in indices])
+        n, d = x.shape
+        steps = epsilon * np.eye(d)
+        points = np.vstack([x, (x[:, None, :] + steps).reshape(-1, d), (x[:, None, :] - steps).reshape(-1, d)])
+        evals = np.asarray(func(points)).reshape(-1)
+        f = evals[:n]
+        grad = (evals[n:n + n * d] - evals[n + n * d:]).reshape(n, d) / (2. * epsilon)
+        requests = {i: runs[i].switch((float(f[k]), grad[k])) for k, i in enumerate(indices)}
+    return results
+
+
+def gradient(x, func=None, batched=False, epsilon=1e-6):
+    ##central differences; if batched, all 2D perturbed points are evaluated in one call of func,
+    ##which requires an acquisition function that is evaluated point by point
+    x = np.asarray(x, dtype=float)
+    d = len(x)
+    steps = epsilon * np.eye(d)
+    points = np.vstack([x + steps, x - steps])
+    if batched:
+        evals = np.asarray(func(points)).reshape(-1)
+    else:
+        evals = np.array([np.asarray(func(point)).reshape(-1)[0] for point in points])
+    return (evals[:d] - evals[d:]) / (2. * epsilon)
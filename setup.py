@@ -49,6 +49,7 @@ setup(
     zip_safe=False,
     extras_require={
         'tests': ['pytest', 'codecov', 'pytest-cov'],
+        'multistart': ['greenlet'],
         'docs': ['sphinx', 'sphinx-rtd-theme', 'myst-parser', 'myst-nb', 'sphinx-panels', 'autodocs', 'sphinx-hoverxref']
     }
 )
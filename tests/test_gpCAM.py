@@ -8,6 +8,8 @@ from gpcam import AutonomousExperimenterFvGP
 from gpcam import GPOptimizer
 from gpcam import fvGPOptimizer
 import time
+import importlib.util
+from unittest import mock
 
 def ac_func1(x, obj):
     r1 = obj.posterior_mean(x)["f(x)"]
@@ -27,6 +29,18 @@ def instrument2(data, instrument_dict=None):
         entry["output positions"] = np.array([[0],[1]])
     return data
 
+def instrument3(data, instrument_dict=None):
+    for entry in data:
+        entry["y_data"] = np.sin(np.linalg.norm(entry["x_data"]))
+        entry["noise variance"] = 0.01
+    return data
+
+def instrument_nan(data, instrument_dict=None):
+    # every second measurement of a call fails
+    for i, entry in enumerate(data):
+        entry["y_data"] = np.nan if i % 2 else np.sin(np.linalg.norm(entry["x_data"]))
+    return data
+
 def mt_kernel(x1,x2,hps,obj):
     d = obj.get_distance_matrix(x1,x2)
     return np.exp(-d)
@@ -128,6 +142,255 @@ class TestgpCAM(unittest.TestCase):
         my_ae.go(N = 20)
 
 
+    def test_ae_posterior_std(self):
+        input_space = np.array([[3.0,45.8],
+                                [4.0,47.0]])
+        x = np.random.uniform(low = input_space[:,0], high = input_space[:,1], size = (10,2))
+        y = np.sin(np.linalg.norm(x, axis = 1))
+        my_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                        x_data = x, y_data = y, noise_variances = np.ones(y.shape) * 0.01)
+        res = my_ae._ask(input_space, n = 1, acquisition_function = "variance", max_iter = 2)
+        post_std = my_ae._posterior_std(res["x"], res["f(x)"])
+        expected = np.sqrt(my_ae.gp_optimizer.posterior_covariance(res["x"], variance_only = True)["v(x)"])
+        self.assertTrue(np.allclose(post_std, expected))
+        self.assertIs(my_ae.noise_variances, my_ae.variances)
+        self.assertIs(my_ae.cost, my_ae.costs)
+
+    def test_ae_checkpoint(self):
+        import os, pickle, tempfile
+        input_space = np.array([[3.0,45.8],
+                                [4.0,47.0]])
+        for communicate_full_dataset in (False, True):
+            my_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                            instrument_function = instrument, init_dataset_size=5,
+                                            communicate_full_dataset = communicate_full_dataset)
+            with tempfile.TemporaryDirectory() as tmp:
+                filename = os.path.join(tmp, "checkpoint")
+                my_ae.go(N = 10, checkpoint_filename = filename)
+                # every entry is logged once
+                logged = 0
+                with open(filename + ".pkl", "rb") as f:
+                    while True:
+                        try:
+                            logged += len(pickle.load(f)[1])
+                        except EOFError:
+                            break
+                self.assertEqual(logged, len(my_ae.data.dataset))
+                for f in (filename + ".pkl", filename + ".npy"):
+                    restored = AutonomousExperimenterGP(input_space, instrument_function = instrument, dataset = f)
+                    self.assertEqual(len(restored.data.dataset), len(my_ae.data.dataset))
+                    self.assertTrue(np.allclose(restored.x_data, my_ae.x_data))
+                    self.assertTrue(np.allclose(restored.y_data, my_ae.y_data))
+
+    def test_ae_train_during_measurement(self):
+        input_space = np.array([[3.0,45.8],
+                                [4.0,47.0]])
+        hps_bounds = np.array([[0.01,100],[0.01,100.0],[0.01,100]])
+        my_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                        hyperparameter_bounds=hps_bounds, instrument_function = instrument,
+                                        init_dataset_size=5)
+        my_ae.go(N = 15, retrain_globally_at = (7, 10), retrain_locally_at = (12,),
+                 training_opt_max_iter = 2, train_during_measurement = True)
+        self.assertEqual(len(my_ae.x_data), 15)
+
+    def test_ae_append(self):
+        input_space = np.array([[3.0,45.8],
+                                [4.0,47.0]])
+        my_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                        instrument_function = instrument3, init_dataset_size=5)
+        my_ae.go(N = 12)
+        gp = my_ae.gp_optimizer
+        self.assertEqual(len(gp.x_data), 12)
+        reference = GPOptimizer(my_ae.x_data, my_ae.y_data, noise_variances = my_ae.variances,
+                                init_hyperparameters = gp.hyperparameters)
+        x = np.random.uniform(low = input_space[:,0], high = input_space[:,1], size = (10,2))
+        self.assertTrue(np.allclose(gp.posterior_mean(x)["f(x)"], reference.posterior_mean(x)["f(x)"]))
+        self.assertTrue(np.allclose(gp.posterior_covariance(x, variance_only = True)["v(x)"],
+                                    reference.posterior_covariance(x, variance_only = True)["v(x)"]))
+
+    def test_posterior_covariance_cache(self):
+        x = np.random.rand(20, 2)
+        y = np.sin(np.linalg.norm(x, axis = 1))
+        x_test = np.random.rand(5, 2)
+        gp = GPOptimizer(x[:10], y[:10], noise_variances = np.ones(10) * 0.01, init_hyperparameters = np.array([1., 1., 1.]))
+        v1 = gp.posterior_covariance(x_test, variance_only = True, cache = True)["v(x)"]
+        self.assertTrue(np.allclose(gp.posterior_covariance(x_test, variance_only = True, cache = True)["v(x)"], v1))
+        gp.update_gp_data(x[10:], y[10:], noise_variances = np.ones(10) * 0.01)
+        reference = GPOptimizer(x, y, noise_variances = np.ones(20) * 0.01, init_hyperparameters = np.array([1., 1., 1.]))
+        v2 = gp.posterior_covariance(x_test, variance_only = True, cache = True)["v(x)"]
+        self.assertTrue(np.allclose(v2, reference.posterior_covariance(x_test, variance_only = True)["v(x)"]))
+        self.assertFalse(np.allclose(v1, v2))
+        # same bytes and shape, but another dtype
+        x_int = x_test.view(np.int64)
+        self.assertTrue(np.allclose(gp.posterior_covariance(x_int, variance_only = True, cache = True)["v(x)"],
+                                    gp.posterior_covariance(x_int, variance_only = True)["v(x)"]))
+
+    @unittest.skipIf(importlib.util.find_spec("greenlet") is None, "greenlet is not installed")
+    def test_multistart_local_ask(self):
+        import gpcam.surrogate_model as sm
+        x = np.random.rand(20, 2)
+        y = np.sin(np.linalg.norm(x, axis = 1))
+        gp = GPOptimizer(x, y, noise_variances = np.ones(20) * 0.01, init_hyperparameters = np.array([1., 1., 1.]))
+        bounds = np.array([[0., 1.], [0., 1.]])
+        x0 = np.random.rand(4, 2)
+        res = gp.ask(bounds, acquisition_function = "variance", method = "local", x0 = x0)
+        with mock.patch.object(sm, "greenlet", None):
+            sequential = gp.ask(bounds, acquisition_function = "variance", method = "local", x0 = x0)
+        self.assertTrue(np.allclose(res["f(x)"], sequential["f(x)"], rtol = 1e-3))
+
+    def test_posterior_mean_and_variance(self):
+        x = np.random.rand(20, 2)
+        y = np.sin(np.linalg.norm(x, axis = 1))
+        gp = GPOptimizer(x, y, noise_variances = np.ones(20) * 0.01, init_hyperparameters = np.array([1., 1., 1.]))
+        x_test = np.random.rand(300, 2)
+        res = gp.posterior_mean_and_variance(x_test)
+        m, v = res["f(x)"], res["v(x)"]
+        self.assertTrue(np.allclose(m, gp.posterior_mean(x_test)["f(x)"]))
+        self.assertTrue(np.allclose(v, gp.posterior_covariance(x_test, variance_only = True)["v(x)"]))
+
+    def test_ask_list_candidates(self):
+        x = np.random.rand(20, 2)
+        y = np.sin(np.linalg.norm(x, axis = 1))
+        gp = GPOptimizer(x, y, noise_variances = np.ones(20) * 0.01, init_hyperparameters = np.array([1., 1., 1.]))
+        candidates = np.random.rand(10, 2)
+        res = gp.ask(candidates = list(candidates), acquisition_function = "variance", n = 3)
+        expected = gp.ask(candidates = candidates, acquisition_function = "variance", n = 3)
+        self.assertTrue(np.allclose(res["x"], expected["x"]))
+
+    def test_ask_kriging_believer(self):
+        x = np.random.rand(20, 2)
+        y = np.sin(np.linalg.norm(x, axis = 1))
+        v = np.random.uniform(0.01, 0.02, 20)
+        gp = GPOptimizer(x, y, noise_variances = v, init_hyperparameters = np.array([1., 1., 1.]))
+        bounds = np.array([[0., 1.], [0., 1.]])
+        x_test = np.random.rand(10, 2)
+        mean = gp.posterior_mean(x_test)["f(x)"]
+        res = gp.ask(bounds, n = 2, kriging_believer = True, max_iter = 2)
+        self.assertTrue(np.array_equal(gp.posterior_mean(x_test)["f(x)"], mean))
+        self.assertEqual(res["x"].shape, (2, 2))
+        self.assertTrue(np.allclose(gp.x_data, x))
+        self.assertTrue(np.allclose(gp.y_data, y))
+        self.assertTrue(np.allclose(np.diag(gp.V), v))
+
+    @unittest.skipIf(importlib.util.find_spec("distributed") is None, "distributed is not installed")
+    def test_ae_instrument_dask_client(self):
+        from distributed import Client
+        input_space = np.array([[3.0,45.8],
+                                [4.0,47.0]])
+        hps_bounds = np.array([[0.01,100],[0.01,100.0],[0.01,100]])
+        client = Client(processes = False)
+        try:
+            my_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                            hyperparameter_bounds=hps_bounds, instrument_function = instrument,
+                                            init_dataset_size=5)
+            my_ae.go(N = 12, retrain_globally_at = (8,), retrain_locally_at = (), training_opt_max_iter = 2,
+                     acq_func_opt_setting = lambda obj: "global", number_of_suggested_measurements = 2,
+                     train_during_measurement = True, instrument_dask_client = client)
+            self.assertEqual(len(my_ae.x_data), 13)
+            self.assertFalse(np.any(np.isnan(my_ae.y_data)))
+            full_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                              instrument_function = instrument, init_dataset_size=5,
+                                              communicate_full_dataset = True)
+            with self.assertRaises(ValueError):
+                full_ae.go(N = 7, instrument_dask_client = client)
+        finally:
+            client.close()
+
+    def test_ae_nan_data(self):
+        input_space = np.array([[3.0,45.8],
+                                [4.0,47.0]])
+        my_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                        instrument_function = instrument_nan, init_dataset_size=6)
+        self.assertEqual(len(my_ae.x_data), 3)
+        my_ae.go(N = 6, number_of_suggested_measurements = 2, acq_func_opt_max_iter = 2)
+        self.assertEqual(len(my_ae.data.dataset), 6)
+        self.assertEqual(len(my_ae.gp_optimizer.x_data), 6)
+        self.assertFalse(np.any(np.isnan(my_ae.y_data)))
+        self.assertTrue(np.allclose(my_ae.x_data, [entry["x_data"] for entry in my_ae.data.dataset]))
+
+    def test_ae_train_on_exit(self):
+        input_space = np.array([[3.0,45.8],
+                                [4.0,47.0]])
+        hps_bounds = np.array([[0.01,100],[0.01,100.0],[0.01,100]])
+        for train_on_exit in (False, True):
+            my_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                            hyperparameter_bounds=hps_bounds, instrument_function = instrument,
+                                            init_dataset_size=5)
+            hps = np.array(my_ae.gp_optimizer.hyperparameters)
+            # the break condition fires in the first iteration, which is also a training iteration
+            my_ae.go(N = 20, retrain_globally_at = (5,), training_opt_max_iter = 5,
+                     break_condition_callable = lambda obj: True, train_on_exit = train_on_exit)
+            self.assertEqual(len(my_ae.x_data), 6)
+            self.assertEqual(np.array_equal(my_ae.gp_optimizer.hyperparameters, hps), not train_on_exit)
+
+    @unittest.skipIf(importlib.util.find_spec("distributed") is None, "distributed is not installed")
+    def test_ae_shared_dask_client(self):
+        from distributed import Client
+        input_space = np.array([[3.0,45.8],
+                                [4.0,47.0]])
+        client = Client(processes = False)
+        try:
+            my_ae = AutonomousExperimenterGP(input_space, hyperparameters=np.array([1.,1.,1.]),
+                                            instrument_function = instrument, init_dataset_size=5,
+                                            training_dask_client = client, share_dask_client = True)
+            # no new client may be constructed
+            with mock.patch("dask.distributed.Client", side_effect = AssertionError("new client constructed")):
+                self.assertIs(my_ae._ensure_client("acq_func_opt_dask_client"), client)
+                self.assertIs(my_ae._ensure_client("training_dask_client"), client)
+                self.assertIs(my_ae._ensure_client("acq_func_opt_dask_client"), client)
+        finally:
+            client.close()
+
+    def test_acq_func_gradient(self):
+        from gpcam.surrogate_model import gradient
+        func = lambda x: np.sum(np.atleast_2d(x) ** 2, axis = 1)
+        x = np.array([0.3, -1.2, 2.])
+        self.assertTrue(np.allclose(gradient(x, func = func, batched = True), 2. * x, atol = 1e-4))
+        self.assertTrue(np.allclose(gradient(x, func = func), 2. * x, atol = 1e-4))
+
+    def test_cholesky_append(self):
+        from gpcam.surrogate_model import cholesky_append
+        B = np.random.rand(50, 50)
+        A = B @ B.T + 50. * np.eye(50)
+        L = np.linalg.cholesky(A[:45, :45])
+        self.assertTrue(np.allclose(cholesky_append(L, A[:45, 45:], A[45:, 45:]), np.linalg.cholesky(A)))
+
+    def test_covariance_state(self):
+        from gpcam.surrogate_model import CovarianceState
+        B = np.random.rand(60, 60)
+        A = B @ B.T + 60. * np.eye(60)
+        state = CovarianceState(iterative_start_size = 30, resize_step = 10)
+        for n in (20, 35, 50, 60):
+            self.assertTrue(np.allclose(state.update(A[:n, :n]), np.linalg.cholesky(A[:n, :n])))
+        L = state.L.copy()
+        A2 = A + np.eye(60)
+        self.assertTrue(np.allclose(state.update(A2[:40, :40]), np.linalg.cholesky(A2[:40, :40])))
+        self.assertTrue(np.allclose(state.update(A2), np.linalg.cholesky(A2)))
+        self.assertTrue(np.allclose(L, np.linalg.cholesky(A)))
+
+    def test_covariance_state_gp(self):
+        x = np.random.rand(40, 2)
+        y = np.sin(np.linalg.norm(x, axis = 1))
+        v = np.ones(40) * 0.01
+        gp = GPOptimizer(x[:20], y[:20], noise_variances = v[:20], init_hyperparameters = np.array([1., 1., 1.]),
+                         iterative_start_size = 10, resize_step = 5)
+        gp.tell(x[20:30], y[20:30], noise_variances = v[20:30], overwrite = False)
+        gp.tell(x[30:], y[30:], noise_variances = v[30:], overwrite = False)
+        reference = GPOptimizer(x, y, noise_variances = v, init_hyperparameters = np.array([1., 1., 1.]))
+        x_test = np.random.rand(10, 2)
+        self.assertTrue(np.allclose(gp.posterior_mean(x_test)["f(x)"], reference.posterior_mean(x_test)["f(x)"]))
+        self.assertTrue(np.allclose(gp.posterior_covariance(x_test, variance_only = True)["v(x)"],
+                                    reference.posterior_covariance(x_test, variance_only = True)["v(x)"]))
+        self.assertTrue(np.isclose(gp.KVlogdet, reference.KVlogdet))
+
+    def test_anisotropic_squared_exponential_kernel(self):
+        from gpcam.surrogate_model import anisotropic_squared_exponential_kernel
+        x1 = np.random.rand(7, 3)
+        x2 = np.random.rand(5, 3)
+        hps = np.array([2., 0.5, 1., 3.])
+        d2 = np.sum(((x1[:, None, :] - x2[None, :, :]) / hps[1:]) ** 2, axis = 2)
+        self.assertTrue(np.allclose(anisotropic_squared_exponential_kernel(x1, x2, hps), 2. * np.exp(-0.5 * d2)))
+
     def test_fvae(self):
         ##set up your parameter space
         input_space = np.array([[3.0,45.8],